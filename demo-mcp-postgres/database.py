@@ -2,84 +2,244 @@
 Database connection management for MCP PostgreSQL server.
 """
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2 import pool
-from typing import List, Dict, Any, Optional
+import time
+import asyncio
+import asyncpg
+import sqlparse
+from cachetools import TTLCache
+from typing import AsyncIterator, List, Dict, Any, Mapping, Optional, Sequence
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Connections older than this are rotated out of the pool (seconds)
+POOL_MAX_AGE = int(os.getenv('POOL_MAX_AGE', '600'))
+
+# Server-side TCP timeout for unacknowledged data (ms). The tcp_user_timeout
+# setting only exists on PostgreSQL 12+; set PG_TCP_USER_TIMEOUT= (empty) for
+# older servers, where it would make every connection attempt fail.
+PG_TCP_USER_TIMEOUT = os.getenv('PG_TCP_USER_TIMEOUT', '30000')
+
+# Rows fetched per round-trip when streaming SELECT results
+FETCH_SIZE = int(os.getenv('FETCH_SIZE', '1000'))
+
+# Result cache for read-only execute_query calls, bounded by the total length
+# of the cached response texts; larger responses are never cached
+QUERY_CACHE_MAX_CHARS = int(os.getenv('QUERY_CACHE_MAX_CHARS', str(64 << 20)))
+QUERY_CACHE_MAX_ENTRY_CHARS = int(os.getenv('QUERY_CACHE_MAX_ENTRY_CHARS', str(4 << 20)))
+QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', '30'))
+
+# How long a schema snapshot is served before it is reloaded (seconds)
+SCHEMA_CACHE_TTL = int(os.getenv('SCHEMA_CACHE_TTL', '60'))
+
+# Schemas, tables and columns in a single round-trip. Kept as a module-level
+# constant so its text (the prepared-statement cache key) stays stable.
+SCHEMA_SNAPSHOT_QUERY = """
+    SELECT 
+        s.schema_name,
+        t.table_name,
+        t.table_type,
+        c.column_name,
+        c.data_type,
+        c.character_maximum_length,
+        c.is_nullable,
+        c.column_default
+    FROM information_schema.schemata s
+    LEFT JOIN information_schema.tables t
+        ON t.table_schema = s.schema_name
+    LEFT JOIN information_schema.columns c
+        ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+    WHERE s.schema_name NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
+    ORDER BY s.schema_name, t.table_name, c.ordinal_position;
+"""
+
+# Targeted lookups for what the snapshot lacks (system catalogs, new tables)
+LIST_TABLES_QUERY = """
+    SELECT 
+        table_schema,
+        table_name,
+        table_type
+    FROM information_schema.tables 
+    WHERE table_schema = $1
+    ORDER BY table_schema, table_name;
+"""
+
+DESCRIBE_TABLE_QUERY = """
+    SELECT 
+        column_name,
+        data_type,
+        character_maximum_length,
+        is_nullable,
+        column_default
+    FROM information_schema.columns 
+    WHERE table_schema = $1 AND table_name = $2
+    ORDER BY ordinal_position;
+"""
+
 
 class DatabaseManager:
     """Manages PostgreSQL database connections and queries."""
     
     def __init__(self):
-        """Initialize database connection pool."""
-        self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1,  # minconn
-            10,  # maxconn
+        """Prepare the database manager; the pool is created by init()."""
+        self.pool: Optional[asyncpg.Pool] = None
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._schema_snapshot: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+        self._schema_loaded_at = 0.0
+        self._schema_lock = asyncio.Lock()
+        self.query_cache: TTLCache = TTLCache(
+            maxsize=QUERY_CACHE_MAX_CHARS, ttl=QUERY_CACHE_TTL, getsizeof=len
+        )
+    
+    async def init(self):
+        """Initialize the asyncpg connection pool."""
+        self.pool = await asyncpg.create_pool(
             host=os.getenv('DB_HOST', 'localhost'),
-            port=os.getenv('DB_PORT', '5432'),
+            port=int(os.getenv('DB_PORT', '5432')),
             database=os.getenv('DB_NAME', 'mcp_database'),
             user=os.getenv('DB_USER', 'postgres'),
-            password=os.getenv('DB_PASSWORD', 'postgres')
+            password=os.getenv('DB_PASSWORD', 'postgres'),
+            min_size=5,
+            max_size=20,
+            max_inactive_connection_lifetime=300,
+            command_timeout=60,
+            # Per-connection LRU of server-side prepared statements
+            statement_cache_size=1024,
+            server_settings=self._server_settings()
         )
+        self._reaper_task = asyncio.create_task(self._reaper())
     
-    def get_connection(self):
-        """Get a connection from the pool."""
-        return self.connection_pool.getconn()
+    @staticmethod
+    def _server_settings() -> Dict[str, str]:
+        """
+        Session settings sent on connect.
+        
+        The keepalive/user-timeout settings configure the server's socket, so the
+        server drops sessions whose client vanished (e.g. dropped NAT flows).
+        They do not protect this process from a dead server; on the client
+        side only command_timeout bounds how long a query waits.
+        """
+        settings = {
+            'statement_timeout': '60000',
+            'tcp_keepalives_idle': '30',
+            'tcp_keepalives_interval': '10',
+            'tcp_keepalives_count': '5'
+        }
+        if PG_TCP_USER_TIMEOUT:
+            settings['tcp_user_timeout'] = PG_TCP_USER_TIMEOUT
+        return settings
     
-    def release_connection(self, conn):
-        """Release a connection back to the pool."""
-        self.connection_pool.putconn(conn)
+    async def _reaper(self):
+        """Rotate pooled connections every POOL_MAX_AGE seconds."""
+        while True:
+            await asyncio.sleep(POOL_MAX_AGE)
+            # Idle connections are already closed by max_inactive_connection_lifetime;
+            # this replaces long-lived busy ones on their next acquire
+            await self.pool.expire_connections()
     
-    def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    async def execute_query(self, query: str, params: Optional[tuple] = None) -> Sequence[Mapping[str, Any]]:
         """
-        Execute a SQL query and return results as a list of dictionaries.
+        Execute a SQL query and return its rows.
         
         Args:
-            query: SQL query string
+            query: SQL query string, using $1, $2, ... placeholders
             params: Optional query parameters for parameterized queries
             
         Returns:
-            List of dictionaries containing query results
+            List of asyncpg Records (read-only mappings) containing query results,
+            or a single {"affected_rows": n} dict for writes without RETURNING;
+            conversion to plain dicts is left to the caller's serializer
         """
-        conn = None
+        params = params or ()
         try:
-            conn = self.get_connection()
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query, params)
-                
-                # For SELECT queries, fetch results
-                if cursor.description:
-                    results = cursor.fetchall()
-                    return [dict(row) for row in results]
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    # For INSERT/UPDATE/DELETE, return affected rows unless the
+                    # statement has a RETURNING clause (i.e. result columns)
+                    # sqlparse skips leading comments and WITH clauses
+                    statements = sqlparse.parse(query)
+                    if statements and statements[0].get_type() in ('INSERT', 'UPDATE', 'DELETE'):
+                        stmt = await conn.prepare(query)
+                        rows = await stmt.fetch(*params)
+                        if stmt.get_attributes():
+                            return rows
+                        return [{"affected_rows": int(stmt.get_statusmsg().split()[-1])}]
+                    
+                    return await conn.fetch(query, *params)
                 
-                # For INSERT/UPDATE/DELETE, commit and return affected rows
-                conn.commit()
-                return [{"affected_rows": cursor.rowcount}]
+        except Exception as e:
+            raise Exception(f"Database error: {str(e)}")
+    
+    async def stream_query(self, query: str, params: Optional[tuple] = None) -> AsyncIterator[List[asyncpg.Record]]:
+        """
+        Stream the rows of a read-only query through a server-side cursor.
+        
+        Args:
+            query: SQL query string, using $1, $2, ... placeholders
+            params: Optional query parameters for parameterized queries
+            
+        Yields:
+            Lists of up to FETCH_SIZE asyncpg Records
+        """
+        params = params or ()
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    cursor = await conn.cursor(query, *params)
+                    while True:
+                        batch = await cursor.fetch(FETCH_SIZE)
+                        if not batch:
+                            break
+                        yield batch
                 
         except Exception as e:
-            if conn:
-                conn.rollback()
             raise Exception(f"Database error: {str(e)}")
-        finally:
-            if conn:
-                self.release_connection(conn)
     
-    def list_schemas(self) -> List[Dict[str, Any]]:
-        """List all non-system schemas in the database."""
-        query = """
-            SELECT schema_name 
-            FROM information_schema.schemata 
-            WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
-            ORDER BY schema_name;
+    async def load_schema_snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
         """
-        return self.execute_query(query)
+        Load every schema, table and column in one query, cached for SCHEMA_CACHE_TTL seconds.
+        
+        Returns:
+            Nested dictionary {schema: {table: {"table_type": ..., "columns": [...]}}}
+        """
+        async with self._schema_lock:
+            if (self._schema_snapshot is not None
+                    and time.monotonic() - self._schema_loaded_at < SCHEMA_CACHE_TTL):
+                return self._schema_snapshot
+            
+            snapshot: Dict[str, Dict[str, Dict[str, Any]]] = {}
+            for row in await self.execute_query(SCHEMA_SNAPSHOT_QUERY):
+                tables = snapshot.setdefault(row['schema_name'], {})
+                if row['table_name'] is None:
+                    continue
+                table = tables.setdefault(row['table_name'], {
+                    "table_type": row['table_type'],
+                    "columns": []
+                })
+                if row['column_name'] is not None:
+                    table["columns"].append({
+                        "column_name": row['column_name'],
+                        "data_type": row['data_type'],
+                        "character_maximum_length": row['character_maximum_length'],
+                        "is_nullable": row['is_nullable'],
+                        "column_default": row['column_default']
+                    })
+            
+            self._schema_snapshot = snapshot
+            self._schema_loaded_at = time.monotonic()
+            return snapshot
     
-    def list_tables(self, schema: Optional[str] = None) -> List[Dict[str, Any]]:
+    def invalidate_schema(self):
+        """Drop the cached schema snapshot so the next call reloads it."""
+        self._schema_snapshot = None
+    
+    async def list_schemas(self) -> List[Dict[str, Any]]:
+        """List all non-system schemas in the database."""
+        snapshot = await self.load_schema_snapshot()
+        return [{"schema_name": name} for name in snapshot]
+    
+    async def list_tables(self, schema: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         List all tables, optionally filtered by schema.
         
@@ -89,30 +249,21 @@ class DatabaseManager:
         Returns:
             List of dictionaries with table information
         """
-        if schema:
-            query = """
-                SELECT 
-                    table_schema,
-                    table_name,
-                    table_type
-                FROM information_schema.tables 
-                WHERE table_schema = %s
-                ORDER BY table_schema, table_name;
-            """
-            return self.execute_query(query, (schema,))
-        else:
-            query = """
-                SELECT 
-                    table_schema,
-                    table_name,
-                    table_type
-                FROM information_schema.tables 
-                WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
-                ORDER BY table_schema, table_name;
-            """
-            return self.execute_query(query)
+        snapshot = await self.load_schema_snapshot()
+        if schema and schema not in snapshot:
+            return [dict(row) for row in await self.execute_query(LIST_TABLES_QUERY, (schema,))]
+        schemas = [schema] if schema else list(snapshot)
+        return [
+            {
+                "table_schema": schema_name,
+                "table_name": table_name,
+                "table_type": table["table_type"]
+            }
+            for schema_name in schemas
+            for table_name, table in snapshot.get(schema_name, {}).items()
+        ]
     
-    def describe_table(self, table_name: str, schema: str = 'public') -> List[Dict[str, Any]]:
+    async def describe_table(self, table_name: str, schema: str = 'public') -> List[Dict[str, Any]]:
         """
         Get detailed information about table columns.
         
@@ -123,20 +274,17 @@ class DatabaseManager:
         Returns:
             List of dictionaries with column information
         """
-        query = """
-            SELECT 
-                column_name,
-                data_type,
-                character_maximum_length,
-                is_nullable,
-                column_default
-            FROM information_schema.columns 
-            WHERE table_schema = %s AND table_name = %s
-            ORDER BY ordinal_position;
-        """
-        return self.execute_query(query, (schema, table_name))
+        snapshot = await self.load_schema_snapshot()
+        table = snapshot.get(schema, {}).get(table_name)
+        if table:
+            return table["columns"]
+        # System schemas, or a table created since the snapshot was taken
+        rows = await self.execute_query(DESCRIBE_TABLE_QUERY, (schema, table_name))
+        return [dict(row) for row in rows]
     
-    def close(self):
+    async def close(self):
         """Close all connections in the pool."""
-        if self.connection_pool:
-            self.connection_pool.closeall()
+        if self._reaper_task:
+            self._reaper_task.cancel()
+        if self.pool:
+            await self.pool.close()
@@ -17,21 +17,23 @@ from tools import (
     handle_execute_query,
     handle_list_schemas,
     handle_list_tables,
-    handle_describe_table
+    handle_describe_table,
+    handle_refresh_schema
 )
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mcp-database")
 
-# Initialize database manager
-db_manager = DatabaseManager()
-
 
 async def main():
     """Main entry point for the MCP server."""
     logger.info("Starting MCP Database Server")
     
+    # Created here rather than at import so spawning the process stays cheap;
+    # the handlers below reach it through their closure
+    db_manager = DatabaseManager()
+    
     # Create MCP server instance
     server = Server("mcp-database")
     
@@ -54,6 +56,8 @@ async def main():
                 return await handle_list_tables(db_manager, arguments)
             elif name == "describe_table":
                 return await handle_describe_table(db_manager, arguments)
+            elif name == "refresh_schema":
+                return await handle_refresh_schema(db_manager, arguments)
             else:
                 return [TextContent(
                     type="text",
@@ -66,14 +70,21 @@ async def main():
                 text=f"Error: {str(e)}"
             )]
     
+    # Open the connection pool before accepting tool calls
+    await db_manager.init()
+    
     # Run the server
-    async with stdio_server() as (read_stream, write_stream):
-        logger.info("Server running with stdio transport")
-        await server.run(
-            read_stream,
-            write_stream,
-            server.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            logger.info("Server running with stdio transport")
+            await server.run(
+                read_stream,
+                write_stream,
+                server.create_initialization_options()
+            )
+    finally:
+        await db_manager.close()
+        logger.info("Database connections closed")
 
 
 if __name__ == "__main__":
@@ -81,6 +92,3 @@ if __name__ == "__main__":
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Server shutdown requested")
-    finally:
-        db_manager.close()
-        logger.info("Database connections closed")
@@ -1,9 +1,81 @@
 """
 MCP tools for database operations.
 """
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from mcp.types import Tool, TextContent
-import json
+import orjson
+import re
+import textwrap
+import asyncpg
+import sqlparse
+from database import QUERY_CACHE_MAX_ENTRY_CHARS
+
+# Read-only statements whose results may be served from the query cache
+READ_QUERY_RE = re.compile(r'^\s*(with|select)\b', re.IGNORECASE)
+DML_KEYWORD_RE = re.compile(r'\b(insert|update|delete|merge)\b', re.IGNORECASE)
+# SELECTs that write or are not repeatable: SELECT ... INTO, row locks, and
+# calls to volatile or side-effecting built-ins. User-defined functions with
+# side effects cannot be detected; callers should pass cache_bypass for those.
+NON_READ_RE = re.compile(
+    r'\binto\b'
+    r'|\bfor\s+(no\s+key\s+update|key\s+share|update|share)\b'
+    r'|\b(nextval|setval|currval|lastval|pg_(try_)?advisory\w*|pg_sleep\w*|pg_notify'
+    r'|set_config|pg_cancel_backend|pg_terminate_backend|txid_current\w*|pg_current_xact_id'
+    r'|random|gen_random_uuid|clock_timestamp|timeofday|dblink\w*|lo_\w+)\s*\(',
+    re.IGNORECASE
+)
+
+
+def _read_cache_key(query: str, params: Optional[tuple]) -> Optional[str]:
+    """
+    Return a normalized cache key for read-only queries, or None for anything else.
+    
+    Only queries with a key are streamed through a server-side cursor and cached.
+    """
+    # strip_whitespace only collapses whitespace tokens, never string literals
+    normalized = sqlparse.format(
+        query, strip_comments=True, strip_whitespace=True, keyword_case='upper'
+    )
+    if (not READ_QUERY_RE.match(normalized)
+            or DML_KEYWORD_RE.search(normalized)
+            or NON_READ_RE.search(normalized)):
+        return None
+    return normalized + repr(params)
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize asyncpg Records as dicts and anything else as a string."""
+    if isinstance(obj, asyncpg.Record):
+        return dict(obj)
+    return str(obj)
+
+
+def _dump(obj: Any) -> str:
+    """Encode a tool response as indented JSON."""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=_json_default).decode()
+
+
+async def _stream_rows_response(db_manager, query: str, params: Optional[tuple]) -> str:
+    """
+    Build the execute_query response for a read-only query batch by batch.
+    
+    Each batch of rows is encoded as soon as it arrives and the Records are
+    dropped, so only the JSON text is held in memory. The output matches
+    _dump() of the full result.
+    """
+    encoded_rows = []
+    async for batch in db_manager.stream_query(query, params):
+        encoded_rows.extend(
+            textwrap.indent(_dump(dict(row)), '    ')
+            for row in batch
+        )
+    
+    data = "[\n" + ",\n".join(encoded_rows) + "\n  ]" if encoded_rows else "[]"
+    return (
+        '{\n  "success": true,\n'
+        f'  "row_count": {len(encoded_rows)},\n'
+        f'  "data": {data}\n}}'
+    )
 
 
 def get_tools() -> list[Tool]:
@@ -14,7 +86,7 @@ def get_tools() -> list[Tool]:
             description=(
                 "Execute a SQL query on the PostgreSQL database. "
                 "Supports SELECT, INSERT, UPDATE, DELETE operations. "
-                "Use parameterized queries for safety."
+                "Use parameterized queries ($1, $2, ...) for safety."
             ),
             inputSchema={
                 "type": "object",
@@ -25,8 +97,13 @@ def get_tools() -> list[Tool]:
                     },
                     "params": {
                         "type": "array",
-                        "description": "Optional parameters for parameterized query",
+                        "description": "Optional parameters for parameterized query ($1, $2, ...)",
                         "items": {"type": ["string", "number", "boolean", "null"]}
+                    },
+                    "cache_bypass": {
+                        "type": "boolean",
+                        "description": "Skip the read-query result cache and hit the database",
+                        "default": False
                     }
                 },
                 "required": ["query"]
@@ -71,6 +148,17 @@ def get_tools() -> list[Tool]:
                 },
                 "required": ["table_name"]
             }
+        ),
+        Tool(
+            name="refresh_schema",
+            description=(
+                "Reload the cached schema snapshot used by list_schemas, "
+                "list_tables and describe_table. Use after DDL changes."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {}
+            }
         )
     ]
 
@@ -83,52 +171,70 @@ async def handle_execute_query(db_manager, arguments: Dict[str, Any]) -> list[Te
     if not query:
         return [TextContent(
             type="text",
-            text=json.dumps({"error": "Query is required"}, indent=2)
+            text=_dump({"error": "Query is required"})
         )]
     
     try:
         # Convert params list to tuple if provided
         params_tuple = tuple(params) if params else None
-        results = db_manager.execute_query(query, params_tuple)
         
-        return [TextContent(
-            type="text",
-            text=json.dumps({
+        # Serve repeated read-only queries from the result cache
+        cache_key = _read_cache_key(query, params_tuple)
+        if cache_key and not arguments.get("cache_bypass"):
+            cached = db_manager.query_cache.get(cache_key)
+            if cached is not None:
+                return [TextContent(type="text", text=cached)]
+        
+        if cache_key:
+            # Read-only: stream rows from a server-side cursor
+            text = await _stream_rows_response(db_manager, query, params_tuple)
+        else:
+            results = await db_manager.execute_query(query, params_tuple)
+            text = _dump({
                 "success": True,
                 "row_count": len(results),
                 "data": results
-            }, indent=2, default=str)
-        )]
+            })
+        
+        if cache_key:
+            if len(text) <= QUERY_CACHE_MAX_ENTRY_CHARS:
+                db_manager.query_cache[cache_key] = text
+        else:
+            # Writes (including DDL) may change any cached result or the schema
+            db_manager.query_cache.clear()
+            db_manager.invalidate_schema()
+        
+        return [TextContent(type="text", text=text)]
     except Exception as e:
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "success": False,
                 "error": str(e)
-            }, indent=2)
+            })
         )]
 
 
 async def handle_list_schemas(db_manager, arguments: Dict[str, Any]) -> list[TextContent]:
     """Handle list_schemas tool call."""
     try:
-        results = db_manager.list_schemas()
+        results = await db_manager.list_schemas()
         schemas = [row['schema_name'] for row in results]
         
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "success": True,
                 "schemas": schemas
-            }, indent=2)
+            })
         )]
     except Exception as e:
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "success": False,
                 "error": str(e)
-            }, indent=2)
+            })
         )]
 
 
@@ -137,23 +243,23 @@ async def handle_list_tables(db_manager, arguments: Dict[str, Any]) -> list[Text
     schema = arguments.get("schema")
     
     try:
-        results = db_manager.list_tables(schema)
+        results = await db_manager.list_tables(schema)
         
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "success": True,
                 "table_count": len(results),
                 "tables": results
-            }, indent=2)
+            })
         )]
     except Exception as e:
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "success": False,
                 "error": str(e)
-            }, indent=2)
+            })
         )]
 
 
@@ -165,26 +271,50 @@ async def handle_describe_table(db_manager, arguments: Dict[str, Any]) -> list[T
     if not table_name:
         return [TextContent(
             type="text",
-            text=json.dumps({"error": "table_name is required"}, indent=2)
+            text=_dump({"error": "table_name is required"})
         )]
     
     try:
-        results = db_manager.describe_table(table_name, schema)
+        results = await db_manager.describe_table(table_name, schema)
         
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "success": True,
                 "schema": schema,
                 "table": table_name,
                 "columns": results
-            }, indent=2)
+            })
+        )]
+    except Exception as e:
+        return [TextContent(
+            type="text",
+            text=_dump({
+                "success": False,
+                "error": str(e)
+            })
+        )]
+
+
+async def handle_refresh_schema(db_manager, arguments: Dict[str, Any]) -> list[TextContent]:
+    """Handle refresh_schema tool call."""
+    try:
+        db_manager.invalidate_schema()
+        snapshot = await db_manager.load_schema_snapshot()
+        
+        return [TextContent(
+            type="text",
+            text=_dump({
+                "success": True,
+                "schema_count": len(snapshot),
+                "table_count": sum(len(tables) for tables in snapshot.values())
+            })
         )]
     except Exception as e:
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "success": False,
                 "error": str(e)
-            }, indent=2)
+            })
         )]
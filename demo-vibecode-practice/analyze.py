@@ -1,4 +1,7 @@
 import os
+import asyncio
+import asyncpg
+import numpy as np
 import pandas as pd
 import json
 import logging
@@ -11,49 +14,133 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, inspect, select, func, column, table
+from sqlalchemy import types as sa_types
+from sqlalchemy.engine import URL
 from dotenv import load_dotenv
 
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-import lightgbm as lgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
+load_dotenv()
+
+# One pooled engine shared by every function in this module
+DB_URL = URL.create(
+    'postgresql+psycopg2',
+    username=os.getenv('DB_USER'),
+    password=os.getenv('DB_PASSWORD'),
+    host=os.getenv('DB_HOST'),
+    port=int(os.getenv('DB_PORT', '5432')),
+    database=os.getenv('DB_NAME')
+)
+engine = create_engine(DB_URL, pool_size=16, max_overflow=0, pool_pre_ping=True, pool_recycle=1800, future=True)
+
+NUMERIC_TYPES = (sa_types.Integer, sa_types.Numeric)
+
+# customer_metrics older than this (seconds) is refreshed before it is modelled
+CUSTOMER_METRICS_MAX_AGE = int(os.getenv('CUSTOMER_METRICS_MAX_AGE', '86400'))
+
+def _as_float(value):
+    return None if value is None else float(value)
+
+def profile_table(conn, table_name, columns):
+    """
+    Profile a table with a single aggregate query so the database computes
+    row count, per-column null counts and numeric summaries in one pass.
+    """
+    aggregates = [func.count().label('n')]
+    for i, col in enumerate(columns):
+        c = column(col['name'])
+        aggregates.append(func.count(c).label(f'nn_{i}'))
+        if isinstance(col['type'], NUMERIC_TYPES):
+            aggregates += [
+                func.avg(c).label(f'mean_{i}'),
+                func.stddev(c).label(f'std_{i}'),
+                func.min(c).label(f'min_{i}'),
+                func.percentile_cont(0.25).within_group(c).label(f'p25_{i}'),
+                func.percentile_cont(0.5).within_group(c).label(f'p50_{i}'),
+                func.percentile_cont(0.75).within_group(c).label(f'p75_{i}'),
+                func.max(c).label(f'max_{i}'),
+            ]
+    row = conn.execute(select(*aggregates).select_from(table(table_name))).mappings().one()
+    
+    numeric_summary = {}
+    for i, col in enumerate(columns):
+        if isinstance(col['type'], NUMERIC_TYPES):
+            numeric_summary[col['name']] = {
+                "count": float(row[f'nn_{i}']),
+                "mean": _as_float(row[f'mean_{i}']),
+                "std": _as_float(row[f'std_{i}']),
+                "min": _as_float(row[f'min_{i}']),
+                "25%": _as_float(row[f'p25_{i}']),
+                "50%": _as_float(row[f'p50_{i}']),
+                "75%": _as_float(row[f'p75_{i}']),
+                "max": _as_float(row[f'max_{i}']),
+            }
+    
+    return {
+        "row_count": row['n'],
+        "column_count": len(columns),
+        "missing_values": {col['name']: row['n'] - row[f'nn_{i}'] for i, col in enumerate(columns)},
+        "numeric_summary": numeric_summary or "No numeric columns",
+        "column_types": {col['name']: str(col['type']) for col in columns}
+    }
+
+def customer_metrics_refreshed_at(conn):
+    """
+    Return when the customer_metrics view was last refreshed, refreshing it
+    first if it is older than CUSTOMER_METRICS_MAX_AGE. Raises if the view
+    has not been created with bootstrap.sql.
+    """
+    if conn.execute(text("SELECT to_regclass('customer_metrics')")).scalar() is None:
+        raise RuntimeError("customer_metrics view not found; create it once with `psql -f bootstrap.sql`")
+    
+    freshness = text("""
+        SELECT max(refreshed_at) AS refreshed_at,
+               extract(epoch FROM now() - max(refreshed_at)) AS age
+        FROM customer_metrics
+    """)
+    row = conn.execute(freshness).one()
+    if row.age is None or row.age > CUSTOMER_METRICS_MAX_AGE:
+        logging.warning(f"customer_metrics last refreshed at {row.refreshed_at}, refreshing")
+        try:
+            conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY customer_metrics"))
+            conn.commit()
+            row = conn.execute(freshness).one()
+        except Exception as e:
+            conn.rollback()
+            logging.warning(f"Could not refresh customer_metrics, using snapshot from {row.refreshed_at}: {str(e)}")
+    return row.refreshed_at
+
+async def _float_numeric(conn):
+    """Decode NUMERIC as float, matching pandas' coerce_float for read_sql."""
+    await conn.set_type_codec('numeric', encoder=str, decoder=float, schema='pg_catalog')
+
+async def run_all(dsn, queries):
+    """Run independent queries concurrently over one asyncpg pool."""
+    pool = await asyncpg.create_pool(dsn, min_size=1, max_size=len(queries), init=_float_numeric)
+    try:
+        return await asyncio.gather(*[pool.fetch(q) for q in queries.values()])
+    finally:
+        await pool.close()
 
 def analyze_data():
-    load_dotenv()
-    landing_dir = 'data/landing'
     analysis_results = {}
+    target_results = {}
     
-    # 1. Basic EDA (Existing logic)
-    if os.path.exists(landing_dir):
-        files = [f for f in os.listdir(landing_dir) if f.endswith('.csv')]
-        for file in files:
-            table_name = file.replace('.csv', '')
-            logging.info(f"Analyzing table: {table_name}")
-            try:
-                df = pd.read_csv(os.path.join(landing_dir, file))
-                analysis_results[table_name] = {
-                    "row_count": len(df),
-                    "column_count": len(df.columns),
-                    "missing_values": df.isnull().sum().to_dict(),
-                    "numeric_summary": df.describe().to_dict() if not df.select_dtypes(include=['number']).empty else "No numeric columns",
-                    "column_types": df.dtypes.astype(str).to_dict()
-                }
-            except Exception as e:
-                logging.error(f"Error analyzing {table_name}: {str(e)}")
+    # 1. Basic EDA (aggregated in the database, one query per table)
+    try:
+        inspector = inspect(engine)
+        with engine.connect() as conn:
+            for table_name in inspector.get_table_names():
+                logging.info(f"Analyzing table: {table_name}")
+                try:
+                    analysis_results[table_name] = profile_table(conn, table_name, inspector.get_columns(table_name))
+                except Exception as e:
+                    conn.rollback()
+                    logging.error(f"Error analyzing {table_name}: {str(e)}")
+    except Exception as e:
+        logging.error(f"Error during basic EDA: {str(e)}")
 
     # 2. Advanced Analysis (Target Queries)
-    target_results = {}
-    db_host = os.getenv('DB_HOST')
-    db_port = os.getenv('DB_PORT')
-    db_name = os.getenv('DB_NAME')
-    db_user = os.getenv('DB_USER')
-    db_password = os.getenv('DB_PASSWORD')
-    connection_string = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-    
     try:
-        engine = create_engine(connection_string)
         queries = {
             "top_albums": """
                 SELECT a.title, SUM(t.unit_price) as album_value
@@ -78,34 +165,56 @@ def analyze_data():
             """
         }
 
-        for key, query in queries.items():
-            logging.info(f"Executing query: {key}")
+        # Customer aggregates come from the customer_metrics materialized view;
+        # its refresh time is recorded so results can be matched to live queries
+        try:
             with engine.connect() as conn:
-                df_target = pd.read_sql(text(query), conn)
-                target_results[key] = df_target.to_dict(orient='records')
+                metrics_refreshed_at = customer_metrics_refreshed_at(conn)
+            target_results['customer_metrics_refreshed_at'] = str(metrics_refreshed_at)
+        except Exception as e:
+            metrics_refreshed_at = None
+            metrics_error = e
+            logging.error(f"customer_metrics unavailable: {str(e)}")
 
-        # 3. Machine Learning (K-Means Clustering)
-        logging.info("Performing customer clustering...")
         customer_query = """
-            SELECT 
-                customer_id,
-                COUNT(invoice_id) as total_invoices,
-                SUM(total) as total_spent
-            FROM invoice
-            GROUP BY customer_id;
+            SELECT customer_id, total_invoices, total_spent
+            FROM customer_metrics;
         """
-        with engine.connect() as conn:
-            df_customers = pd.read_sql(text(customer_query), conn)
+
+        asyncpg_dsn = DB_URL.set(drivername='postgresql').render_as_string(hide_password=False)
+
+        # Independent queries run concurrently; wall time is the slowest one
+        all_queries = dict(queries)
+        if metrics_refreshed_at is not None:
+            all_queries["customer_query"] = customer_query
+        logging.info(f"Executing queries concurrently: {list(all_queries)}")
+        all_rows = asyncio.run(run_all(asyncpg_dsn, all_queries))
+        for key, rows in zip(queries, all_rows):
+            target_results[key] = [dict(r) for r in rows]
+        
+        # Live target queries are kept; the customer models need the view
+        if metrics_refreshed_at is None:
+            raise RuntimeError(f"Skipping clustering and prediction: {metrics_error}")
+        customer_rows = all_rows[-1]
+
+        # 3. Machine Learning (K-Means Clustering)
+        logging.info("Performing customer clustering...")
+        df_customers = pd.DataFrame([dict(r) for r in customer_rows])
         
         if not df_customers.empty:
+            # Heavy ML dependencies are only imported when there is data to model
+            from sklearn.cluster import MiniBatchKMeans
+            from sklearn.preprocessing import StandardScaler
+            
             # Preprocessing
             X_clust = df_customers[['total_invoices', 'total_spent']]
-            scaler = StandardScaler()
-            X_scaled = scaler.fit_transform(X_clust)
+            scaler = StandardScaler(copy=False)
+            X_scaled = scaler.fit_transform(X_clust).astype(np.float32, copy=False)
             
-            # K-Means
-            kmeans = KMeans(n_clusters=3, random_state=42, n_init=10)
-            df_customers['cluster'] = kmeans.fit_predict(X_scaled)
+            # K-Means (mini-batch, float32)
+            kmeans = MiniBatchKMeans(n_clusters=3, batch_size=1024, n_init=3, random_state=42, max_iter=100)
+            kmeans.fit(X_scaled)
+            df_customers['cluster'] = kmeans.labels_
             
             target_results['customer_clusters'] = df_customers.to_dict(orient='records')
             logging.info("Customer clustering complete.")
@@ -113,46 +222,61 @@ def analyze_data():
         # 4. LightGBM (Spending Prediction)
         logging.info("Training LightGBM model...")
         predict_query = """
-            SELECT 
-                c.customer_id,
-                c.country,
-                c.support_rep_id,
-                COUNT(i.invoice_id) as total_invoices,
-                SUM(i.total) as total_spent
-            FROM customer c
-            JOIN invoice i ON c.customer_id = i.customer_id
-            GROUP BY c.customer_id, c.country, c.support_rep_id;
+            SELECT customer_id, country, support_rep_id, total_invoices, total_spent
+            FROM customer_metrics;
         """
-        with engine.connect() as conn:
-            df_pred = pd.read_sql(text(predict_query), conn)
+        feature_names = ['country', 'support_rep_id', 'total_invoices']
+        country_codes = {}
+        X_chunks, y_chunks = [], []
+        with engine.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(text(predict_query), conn, chunksize=50_000):
+                # Category codes for LightGBM's native categorical splits,
+                # kept stable across chunks by a running vocabulary
+                for country in chunk['country'].unique():
+                    country_codes.setdefault(country, len(country_codes))
+                chunk['country'] = chunk['country'].map(country_codes)
+                X_chunks.append(chunk[feature_names].to_numpy(dtype=np.float64))
+                y_chunks.append(chunk['total_spent'].to_numpy(dtype=np.float64))
             
-        if not df_pred.empty:
-            # Encodings
-            le_country = LabelEncoder()
-            df_pred['country_code'] = le_country.fit_transform(df_pred['country'])
+        # Features and Target
+        X = np.vstack(X_chunks) if X_chunks else np.empty((0, len(feature_names)))
+        y = np.concatenate(y_chunks) if y_chunks else np.empty(0)
             
-            # Features and Target
-            X = df_pred[['country_code', 'support_rep_id', 'total_invoices']]
-            y = df_pred['total_spent']
+        if len(y):
+            import lightgbm as lgb
+            from sklearn.model_selection import train_test_split
+            from sklearn.metrics import mean_squared_error, r2_score
             
             X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
             
+            # Validation fold for early stopping
+            X_tr, X_val, y_tr, y_val = train_test_split(X_train, y_train, test_size=0.1, random_state=42)
+            
             # Model
-            model = lgb.LGBMRegressor(n_estimators=100, random_state=42, verbose=-1)
-            model.fit(X_train, y_train)
+            dtrain = lgb.Dataset(
+                X_tr, label=y_tr, feature_name=feature_names,
+                categorical_feature=['country'], free_raw_data=True
+            )
+            dval = lgb.Dataset(X_val, label=y_val, reference=dtrain)
+            params = {'objective': 'regression', 'num_leaves': 31, 'learning_rate': 0.05, 'seed': 42, 'verbosity': -1}
+            model = lgb.train(
+                params, dtrain, num_boost_round=100, valid_sets=[dval],
+                callbacks=[lgb.early_stopping(20, verbose=False), lgb.log_evaluation(0)]
+            )
             
             # Prediction
-            y_pred = model.predict(X_test)
+            y_pred = model.predict(X_test, num_iteration=model.best_iteration, predict_disable_shape_check=True)
             
             # Results
             target_results['prediction_results'] = {
                 "r2_score": r2_score(y_test, y_pred),
+                "best_iteration": model.best_iteration,
                 "mse": mean_squared_error(y_test, y_pred),
-                "feature_importance": dict(zip(X.columns.tolist(), model.feature_importances_.tolist())),
-                "actual_vs_pred": pd.DataFrame({
+                "feature_importance": dict(zip(feature_names, model.feature_importance().tolist())),
+                "actual_vs_pred": {
                     "actual": y_test.tolist(),
                     "predicted": y_pred.tolist()
-                }).to_dict(orient='records')
+                }
             }
             logging.info("LightGBM training complete.")
 
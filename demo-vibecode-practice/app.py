@@ -110,6 +110,8 @@ elif app_mode == "Customer Segmentation":
     
     if "customer_clusters" in target_data:
         df_clusters = pd.DataFrame(target_data["customer_clusters"])
+        if "customer_metrics_refreshed_at" in target_data:
+            st.caption(f"Customer metrics as of {target_data['customer_metrics_refreshed_at']}")
         
         st.write("""
         This analysis uses **K-Means Clustering** to segment customers into 3 groups based on their purchasing behavior:
@@ -148,10 +150,13 @@ elif app_mode == "Predictive Analytics":
     
     if "prediction_results" in target_data:
         pred_res = target_data["prediction_results"]
+        if "customer_metrics_refreshed_at" in target_data:
+            st.caption(f"Customer metrics as of {target_data['customer_metrics_refreshed_at']}")
         
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         col1.metric("R² Score", f"{pred_res['r2_score']:.4f}")
         col2.metric("Mean Squared Error", f"{pred_res['mse']:.2f}")
+        col3.metric("Boosting Rounds", pred_res.get('best_iteration', 'N/A'))
         
         # Feature Importance
         st.subheader("Feature Importance")
@@ -0,0 +1,25 @@
+-- Pre-aggregated per-customer metrics read by analyze.py.
+-- Run once by hand (psql -f bootstrap.sql); analyze.py never executes DDL.
+-- Every statement is idempotent, but an existing view is left untouched:
+-- drop it first if its definition changes.
+--
+-- Refresh on a schedule (cron, pg_cron, ...), see README.md:
+--   REFRESH MATERIALIZED VIEW CONCURRENTLY customer_metrics;
+-- analyze.py also refreshes it when refreshed_at is older than
+-- CUSTOMER_METRICS_MAX_AGE.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS customer_metrics AS
+SELECT
+    c.customer_id,
+    c.country,
+    c.support_rep_id,
+    COUNT(i.invoice_id) AS total_invoices,
+    SUM(i.total) AS total_spent,
+    now() AS refreshed_at
+FROM customer c
+JOIN invoice i USING (customer_id)
+GROUP BY 1, 2, 3;
+
+-- Required by REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS customer_metrics_customer_id_idx
+    ON customer_metrics (customer_id);
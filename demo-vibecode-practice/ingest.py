@@ -2,7 +2,10 @@ import os
 import logging
 import json
 import pandas as pd
-from sqlalchemy import create_engine, inspect
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2 import sql
+from sqlalchemy import create_engine, inspect, select, literal_column, table
+from sqlalchemy.engine import URL
 from dotenv import load_dotenv
 
 # Setup logging
@@ -13,19 +16,62 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def ingest_data():
-    load_dotenv()
+load_dotenv()
+
+# One pooled engine shared by every function in this module,
+# sized so each ingest worker gets its own connection
+DB_URL = URL.create(
+    'postgresql+psycopg2',
+    username=os.getenv('DB_USER'),
+    password=os.getenv('DB_PASSWORD'),
+    host=os.getenv('DB_HOST'),
+    port=int(os.getenv('DB_PORT', '5432')),
+    database=os.getenv('DB_NAME')
+)
+engine = create_engine(DB_URL, pool_size=16, max_overflow=0, pool_pre_ping=True, pool_recycle=1800, future=True)
+
+def _ingest_one(table_name, engine):
+    """Ingest a single table to landing and write its metadata."""
+    logging.info(f"Ingesting table: {table_name}")
     
-    db_host = os.getenv('DB_HOST')
-    db_port = os.getenv('DB_PORT')
-    db_name = os.getenv('DB_NAME')
-    db_user = os.getenv('DB_USER')
-    db_password = os.getenv('DB_PASSWORD')
+    # Save data to landing, streamed by the server with COPY
+    copy_query = sql.SQL("COPY (SELECT * FROM {}) TO STDOUT WITH CSV HEADER").format(
+        sql.Identifier(table_name)
+    )
+    raw_conn = engine.raw_connection()
+    try:
+        with raw_conn.cursor() as cursor, open(f'data/landing/{table_name}.csv', 'wb') as f:
+            cursor.copy_expert(copy_query.as_string(cursor), f)
+    finally:
+        raw_conn.close()
+    
+    # Extract metadata
+    sample_query = select(literal_column('*')).select_from(table(table_name)).limit(5)
+    df_sample = pd.read_sql(sample_query, engine)
+    columns = inspect(engine).get_columns(table_name)
+    metadata = {
+        "table_name": table_name,
+        "column_info": [],
+        "data_sample": df_sample.to_dict(orient='records')
+    }
     
-    connection_string = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+    for col in columns:
+        metadata["column_info"].append({
+            "column_name": col['name'],
+            "data_type": str(col['type']),
+            "nullable": col['nullable'],
+            "default": str(col['default']) if col['default'] else None,
+            "description": col.get('comment', '')
+        })
     
+    # Save metadata
+    with open(f'data/metadata/{table_name}_metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=4, default=str)
+        
+    logging.info(f"Successfully ingested {table_name}")
+
+def ingest_data():
     try:
-        engine = create_engine(connection_string)
         inspector = inspect(engine)
         tables = inspector.get_table_names()
         
@@ -34,41 +80,10 @@ def ingest_data():
         os.makedirs('data/landing', exist_ok=True)
         os.makedirs('data/metadata', exist_ok=True)
         
-        for table_name in tables:
-            logging.info(f"Ingesting table: {table_name}")
-            
-            # Save data to landing
-            df = pd.read_sql_table(table_name, engine)
-            df.to_csv(f'data/landing/{table_name}.csv', index=False)
-            
-            # Extract metadata
-            columns = inspector.get_columns(table_name)
-            metadata = {
-                "table_name": table_name,
-                "column_info": [],
-                "data_sample": df.head(5).to_dict(orient='records')
-            }
-            
-            for col in columns:
-                metadata["column_info"].append({
-                    "column_name": col['name'],
-                    "data_type": str(col['type']),
-                    "nullable": col['nullable'],
-                    "default": str(col['default']) if col['default'] else None,
-                    "description": col.get('comment', '')
-                })
-            
-            # Save metadata
-            def json_serial(obj):
-                """JSON serializer for objects not serializable by default json code"""
-                if isinstance(obj, (pd.Timestamp, pd.Series, pd.Index)):
-                    return str(obj)
-                return str(obj)
-
-            with open(f'data/metadata/{table_name}_metadata.json', 'w') as f:
-                json.dump(metadata, f, indent=4, default=json_serial)
-                
-            logging.info(f"Successfully ingested {table_name}")
+        # Overlap per-table network I/O and file writes
+        max_workers = int(os.getenv('INGEST_WORKERS', '8'))
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            list(ex.map(lambda t: _ingest_one(t, engine), tables))
             
     except Exception as e:
         logging.error(f"Error during ingestion: {str(e)}")
@@ -1,6 +1,10 @@
 import os
-import pandas as pd
+import time
+import hashlib
+import polars as pl
+import polars.selectors as cs
 import json
+import orjson
 import logging
 
 # Setup logging
@@ -11,6 +15,57 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Per-table results are reused while the landing file's content hash matches.
+# Bump the version whenever the shape of a table's results changes.
+CACHE_FILE = 'data/.analysis_cache.json'
+CACHE_VERSION = 3
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+def file_signature(path):
+    """Content hash of a landing file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_analysis_cache():
+    """Load the sidecar cache, ignoring it when missing, outdated or older than CACHE_MAX_AGE."""
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get('version') != CACHE_VERSION or time.time() - cache.get('created_at', 0) > CACHE_MAX_AGE:
+        return None
+    return cache
+
+def save_analysis_cache(cache):
+    """Write the sidecar cache atomically."""
+    tmp_file = f'{CACHE_FILE}.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, CACHE_FILE)
+
+def numeric_summary(df):
+    """
+    Describe numeric columns in the same {column: {statistic: value}} shape
+    that pandas' describe().to_dict() produced. Quartiles use linear
+    interpolation, as pandas does (polars defaults to 'nearest').
+    
+    >>> numeric_summary(pl.DataFrame({'a': [1, 2, 3, 4]}))['a']
+    {'count': 4.0, 'mean': 2.5, 'std': 1.2909944487358056, 'min': 1.0, '25%': 1.75, '50%': 2.5, '75%': 3.25, 'max': 4.0}
+    """
+    numeric = df.select(cs.numeric())
+    if numeric.width == 0:
+        return None
+    desc = numeric.describe(interpolation='linear')
+    stats = desc['statistic'].to_list()
+    return {
+        col: {stat: value for stat, value in zip(stats, desc[col].to_list()) if stat != 'null_count'}
+        for col in numeric.columns
+    }
+
 def analyze_data():
     """
     Analyze data from data/landing directory.
@@ -24,49 +79,80 @@ def analyze_data():
         logging.error(f"{landing_dir} directory not found")
         return
     
-    files = [f for f in os.listdir(landing_dir) if f.endswith('.csv')]
+    files = [f for f in os.listdir(landing_dir) if f.endswith('.parquet')]
     
     if not files:
-        print(f"❌ Error: No CSV files found in {landing_dir}. Please run ingest.py first.")
-        logging.error(f"No CSV files found in {landing_dir}")
+        print(f"❌ Error: No Parquet files found in {landing_dir}. Please run ingest.py first.")
+        logging.error(f"No Parquet files found in {landing_dir}")
         return
     
     print(f"Starting analysis of {len(files)} tables...")
     logging.info(f"Starting analysis of {len(files)} tables")
     
+    cache = load_analysis_cache()
+    cached_tables = cache['tables'] if cache else {}
+    new_cache = {
+        "version": CACHE_VERSION,
+        "created_at": cache['created_at'] if cache else time.time(),
+        "tables": {}
+    }
+    
     for file in files:
-        table_name = file.replace('.csv', '')
+        table_name = file.replace('.parquet', '')
         logging.info(f"Analyzing table: {table_name}")
         print(f"\n📊 Analyzing: {table_name}")
         
         try:
-            df = pd.read_csv(os.path.join(landing_dir, file))
+            path = os.path.join(landing_dir, file)
+            signature = file_signature(path)
+            
+            # Skip tables whose landing file is unchanged since the last run
+            cached = cached_tables.get(table_name)
+            if cached and cached['signature'] == signature:
+                analysis_results[table_name] = cached['result']
+                new_cache['tables'][table_name] = cached
+                print("  ✓ Unchanged since last run, reusing cached analysis")
+                logging.info(f"Reused cached analysis for {table_name}")
+                continue
+            
+            df = pl.read_parquet(path)
+            missing_values = dict(zip(df.columns, df.null_count().row(0)))
+            missing_count = sum(missing_values.values())
             
             # Basic statistics
             analysis_results[table_name] = {
-                "row_count": len(df),
-                "column_count": len(df.columns),
-                "columns": df.columns.tolist(),
-                "missing_values": df.isnull().sum().to_dict(),
-                "column_types": df.dtypes.astype(str).to_dict()
+                "row_count": df.height,
+                "column_count": df.width,
+                "columns": df.columns,
+                "missing_values": missing_values,
+                # Precomputed for the dashboard so it doesn't redo this on every rerun
+                "total_missing": missing_count,
+                "missing_nonzero": sorted(
+                    ([col, n] for col, n in missing_values.items() if n > 0),
+                    key=lambda item: -item[1]
+                ),
+                "column_types": {name: str(dtype) for name, dtype in df.schema.items()}
             }
             
             # Numeric summary if numeric columns exist
-            numeric_cols = df.select_dtypes(include=['number'])
-            if not numeric_cols.empty:
-                analysis_results[table_name]["numeric_summary"] = df.describe().to_dict()
-                print(f"  ✓ {len(df)} rows, {len(df.columns)} columns ({len(numeric_cols.columns)} numeric)")
+            summary = numeric_summary(df)
+            if summary:
+                analysis_results[table_name]["numeric_summary"] = summary
+                print(f"  ✓ {df.height} rows, {df.width} columns ({len(summary)} numeric)")
             else:
                 analysis_results[table_name]["numeric_summary"] = "No numeric columns"
-                print(f"  ✓ {len(df)} rows, {len(df.columns)} columns (no numeric columns)")
+                print(f"  ✓ {df.height} rows, {df.width} columns (no numeric columns)")
             
             # Missing values summary
-            missing_count = df.isnull().sum().sum()
             if missing_count > 0:
                 print(f"  ⚠️  {missing_count} missing values found")
             else:
-                print(f"  ✓ No missing values")
+                print("  ✓ No missing values")
                 
+            new_cache['tables'][table_name] = {
+                "signature": signature,
+                "result": analysis_results[table_name]
+            }
             logging.info(f"Successfully analyzed {table_name}")
             
         except Exception as e:
@@ -77,8 +163,9 @@ def analyze_data():
     os.makedirs('data', exist_ok=True)
     output_file = 'data/analysis_results.json'
     
-    with open(output_file, 'w') as f:
-        json.dump(analysis_results, f, indent=4)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(analysis_results, option=orjson.OPT_INDENT_2))
+    save_analysis_cache(new_cache)
     
     print(f"\n✅ Analysis complete! Results saved to {output_file}")
     logging.info(f"Analysis results saved to {output_file}")
@@ -1,13 +1,59 @@
 import streamlit as st
 import pandas as pd
-import json
+import orjson
 import os
-import plotly.express as px
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
 st.set_page_config(page_title="NECTEC Demo Dashboard", layout="wide", page_icon="📊")
 
 st.title("📊 NECTEC Demo - Data Dashboard")
 
+# Bars drawn in the missing-values chart before the rest are bucketed
+MAX_MISSING_BARS = 50
+
+
+# Shared engine for live queries. cache_resource returns the same engine object
+# by reference (no per-session copy), so the pool is created once per server.
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    from db import create_db_engine
+    return create_db_engine()
+
+
+# Cached loaders: the file's mtime is part of the cache key, so a rerun only
+# re-reads a file after the pipeline has rewritten it
+@st.cache_data(show_spinner=False)
+def load_analysis(path, mtime):
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+
+@st.cache_data(show_spinner=False)
+def load_metadata(table_name, mtime):
+    with open(f'data/metadata/{table_name}_metadata.json', 'rb') as f:
+        return orjson.loads(f.read())
+
+
+@st.cache_data(show_spinner=False)
+def load_preview(table_name, mtime, row_limit):
+    # Only the first row_limit rows are decoded, not the whole file
+    parquet_file = pq.ParquetFile(f'data/landing/{table_name}.parquet')
+    batch = next(parquet_file.iter_batches(batch_size=row_limit), None)
+    if batch is None:
+        return parquet_file.schema_arrow.empty_table().to_pandas()
+    return batch.to_pandas()
+
+
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(table_name, mtime):
+    # Arrow's C++ CSV writer, straight from the Parquet file
+    sink = pa.BufferOutputStream()
+    pacsv.write_csv(pq.read_table(f'data/landing/{table_name}.parquet'), sink)
+    return sink.getvalue().to_pybytes()
+
+
 # Load analysis results
 analysis_file = 'data/analysis_results.json'
 if not os.path.exists(analysis_file):
@@ -19,8 +65,7 @@ if not os.path.exists(analysis_file):
     """)
     st.stop()
 
-with open(analysis_file, 'r') as f:
-    analysis_data = json.load(f)
+analysis_data = load_analysis(analysis_file, os.path.getmtime(analysis_file))
 
 # Sidebar navigation
 st.sidebar.header("Navigation")
@@ -50,24 +95,41 @@ if selected_table:
         col1.metric("📊 Row Count", f"{table_stats['row_count']:,}")
         col2.metric("📋 Column Count", table_stats['column_count'])
         
-        # Count missing values
-        total_missing = sum(table_stats['missing_values'].values())
+        # Count missing values (precomputed by analyze.py; derived for older results)
+        missing_values = table_stats['missing_values']
+        total_missing = table_stats.get('total_missing')
+        if total_missing is None:
+            total_missing = sum(missing_values.values())
         col3.metric("⚠️ Missing Values", f"{total_missing:,}")
         
         # Missing values chart
         if total_missing > 0:
+            # Plotly is only imported on reruns that actually draw the chart
+            import plotly.graph_objects as go
+            
             st.write("### Missing Values by Column")
-            missing_df = pd.DataFrame(
-                [(k, v) for k, v in table_stats['missing_values'].items() if v > 0],
-                columns=['Column', 'Missing Count']
-            )
-            fig = px.bar(
-                missing_df, 
-                x='Column', 
-                y='Missing Count',
+            items = table_stats.get('missing_nonzero')
+            if items is None:
+                items = sorted(
+                    ([k, v] for k, v in missing_values.items() if v > 0),
+                    key=lambda kv: -kv[1]
+                )
+            
+            # Wide tables: keep the render bounded by drawing the top columns
+            # and bucketing the rest, unless the user asks for all of them
+            if len(items) > MAX_MISSING_BARS and not st.checkbox("Show all columns"):
+                others = sum(v for _, v in items[MAX_MISSING_BARS:])
+                items = items[:MAX_MISSING_BARS] + [(f'…{len(items) - MAX_MISSING_BARS} others', others)]
+            counts = [v for _, v in items]
+            fig = go.Figure(go.Bar(
+                x=[k for k, _ in items],
+                y=counts,
+                marker=dict(color=counts, colorscale='Reds', showscale=True)
+            ))
+            fig.update_layout(
                 title="Missing Values Distribution",
-                color='Missing Count',
-                color_continuous_scale='Reds'
+                xaxis_title='Column',
+                yaxis_title='Missing Count'
             )
             st.plotly_chart(fig, use_container_width=True)
         else:
@@ -83,11 +145,10 @@ if selected_table:
         
         # Column types
         st.write("### Column Data Types")
-        types_df = pd.DataFrame(
-            table_stats['column_types'].items(),
-            columns=['Column Name', 'Data Type']
-        )
-        st.dataframe(types_df, use_container_width=True)
+        st.dataframe({
+            'Column Name': list(table_stats['column_types'].keys()),
+            'Data Type': list(table_stats['column_types'].values())
+        }, use_container_width=True)
     
     # Tab 2: Metadata
     with tab2:
@@ -95,8 +156,7 @@ if selected_table:
         
         metadata_file = f'data/metadata/{selected_table}_metadata.json'
         if os.path.exists(metadata_file):
-            with open(metadata_file, 'r') as f:
-                meta = json.load(f)
+            meta = load_metadata(selected_table, os.path.getmtime(metadata_file))
             
             st.write("#### Table Information")
             info_col1, info_col2 = st.columns(2)
@@ -104,12 +164,10 @@ if selected_table:
             info_col2.write(f"**Total Rows:** {meta['row_count']:,}")
             
             st.write("#### Column Definitions")
-            col_info_df = pd.DataFrame(meta['column_info'])
-            st.dataframe(col_info_df, use_container_width=True)
+            st.dataframe(meta['column_info'], use_container_width=True)
             
             st.write("#### Sample Data")
-            sample_df = pd.DataFrame(meta['data_sample'])
-            st.dataframe(sample_df, use_container_width=True)
+            st.dataframe(meta['data_sample'], use_container_width=True)
         else:
             st.warning(f"⚠️ Metadata file not found: {metadata_file}")
     
@@ -117,20 +175,23 @@ if selected_table:
     with tab3:
         st.subheader("Data Preview")
         
-        landing_file = f'data/landing/{selected_table}.csv'
+        landing_file = f'data/landing/{selected_table}.parquet'
         if os.path.exists(landing_file):
-            df = pd.read_csv(landing_file)
+            landing_mtime = os.path.getmtime(landing_file)
+            
+            # Row count comes from the Parquet footer, not a full file scan
+            total_rows = pq.ParquetFile(landing_file).metadata.num_rows
             
             # Show number of rows
-            st.write(f"**Total rows:** {len(df):,}")
+            st.write(f"**Total rows:** {total_rows:,}")
             
             # Row limit selector
-            row_limit = st.slider("Number of rows to display", 10, min(500, len(df)), 100)
+            row_limit = st.slider("Number of rows to display", 10, min(500, total_rows), 100)
             
-            st.dataframe(df.head(row_limit), use_container_width=True)
+            st.dataframe(load_preview(selected_table, landing_mtime, row_limit), use_container_width=True)
             
             # Download button
-            csv = df.to_csv(index=False).encode('utf-8')
+            csv = to_csv_bytes(selected_table, landing_mtime)
             st.download_button(
                 label="📥 Download Full CSV",
                 data=csv,
@@ -0,0 +1,22 @@
+import os
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+
+def connection_string():
+    """Build the PostgreSQL connection string from the .env settings."""
+    load_dotenv()
+
+    db_host = os.getenv('DB_HOST')
+    db_port = os.getenv('DB_PORT')
+    db_name = os.getenv('DB_NAME')
+    db_user = os.getenv('DB_USER')
+    db_password = os.getenv('DB_PASSWORD')
+
+    return f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+
+def create_db_engine(pool_size=5):
+    """Create a pooled engine for the nectec_demo database."""
+    return create_engine(connection_string(), pool_size=pool_size, max_overflow=0, pool_pre_ping=True)
+
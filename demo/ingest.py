@@ -1,9 +1,15 @@
 import os
 import logging
-import json
-import pandas as pd
-from sqlalchemy import create_engine, inspect
+import orjson
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from psycopg2 import sql
+from sqlalchemy import inspect, text
 from dotenv import load_dotenv
+from db import create_db_engine
 
 # Setup logging
 os.makedirs('logs', exist_ok=True)
@@ -13,26 +19,155 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Concurrent table extractions; the engine pool is sized to match
+POOL_SIZE = int(os.getenv('INGEST_WORKERS', '5'))
+
+# Bytes of COPY output parsed and written per batch; bounds memory to one block per table
+BLOCK_SIZE = int(os.getenv('INGEST_BLOCK_SIZE', str(16 << 20)))
+
+# Arrow types for PostgreSQL columns; anything not listed is read as a string
+ARROW_TYPES = {
+    'smallint': pa.int16(),
+    'integer': pa.int32(),
+    'bigint': pa.int64(),
+    'real': pa.float32(),
+    'double precision': pa.float64(),
+    'numeric': pa.float64(),
+    'boolean': pa.bool_(),
+    'date': pa.date32(),
+    'timestamp without time zone': pa.timestamp('us'),
+    'timestamp with time zone': pa.timestamp('us', tz='UTC'),
+}
+
+# Column metadata for every public table, fetched in one round-trip
+COLUMNS_QUERY = text("""
+    SELECT
+        c.table_name,
+        c.column_name,
+        c.data_type,
+        c.character_maximum_length,
+        c.numeric_precision,
+        c.numeric_scale,
+        c.is_nullable,
+        c.column_default,
+        col_description(format('%I.%I', c.table_schema, c.table_name)::regclass, c.ordinal_position) AS description
+    FROM information_schema.columns c
+    WHERE c.table_schema = 'public'
+    ORDER BY c.table_name, c.ordinal_position
+""")
+
+def load_column_info(conn):
+    """Group column metadata by table name."""
+    cols_by_table = {}
+    for row in conn.execute(COLUMNS_QUERY).mappings():
+        data_type = row['data_type']
+        if row['character_maximum_length'] is not None:
+            data_type = f"{data_type}({row['character_maximum_length']})"
+        elif data_type == 'numeric' and row['numeric_precision'] is not None:
+            # Integer and float types also report a precision; only numeric declares one
+            data_type = f"{data_type}({row['numeric_precision']}, {row['numeric_scale']})"
+        cols_by_table.setdefault(row['table_name'], []).append({
+            "column_name": row['column_name'],
+            "data_type": data_type,
+            "nullable": row['is_nullable'] == 'YES',
+            "default": row['column_default'],
+            "description": row['description']
+        })
+    return cols_by_table
+
+def csv_convert_options(column_info):
+    """Parse COPY's CSV output with the table's declared types instead of inferring them."""
+    return pacsv.ConvertOptions(
+        column_types={
+            col['column_name']: ARROW_TYPES.get(col['data_type'].split('(')[0], pa.string())
+            for col in column_info
+        },
+        true_values=['t'],
+        false_values=['f'],
+        # COPY writes NULL unquoted and empty strings as ""
+        null_values=[''],
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False
+    )
+
+def ingest_one(table_name, engine, column_info):
+    """Ingest one table to landing and write its metadata; returns (table_name, row_count)."""
+    logging.info(f"Ingesting table: {table_name}")
+    print(f"\n📊 Processing table: {table_name}")
+    
+    # Each worker checks out its own pooled connection and COPYs the table
+    # server-side to a local spool file
+    parquet_path = f'data/landing/{table_name}.parquet'
+    with tempfile.TemporaryFile() as spool:
+        raw_conn = engine.raw_connection()
+        try:
+            with raw_conn.cursor() as cur:
+                cur.copy_expert(
+                    sql.SQL("COPY {} TO STDOUT WITH (FORMAT CSV, HEADER)").format(sql.Identifier(table_name)),
+                    spool
+                )
+        finally:
+            raw_conn.close()
+        spool.seek(0)
+        
+        # Stream the CSV into Parquet block by block
+        reader = pacsv.open_csv(
+            spool,
+            read_options=pacsv.ReadOptions(block_size=BLOCK_SIZE),
+            convert_options=csv_convert_options(column_info)
+        )
+        column_count = len(reader.schema)
+        data_sample = []
+        row_count = 0
+        with pq.ParquetWriter(parquet_path, reader.schema, compression='zstd') as writer:
+            for batch in reader:
+                if not data_sample:
+                    # Sample is taken from the first batch as it streams past; to_pylist()
+                    # yields native Python scalars (None for nulls, datetime for
+                    # timestamps) that orjson encodes without the default= fallback
+                    data_sample = batch.slice(0, 5).to_pylist()
+                writer.write_batch(batch)
+                row_count += batch.num_rows
+    print(f"  ✓ Saved {row_count} rows to {parquet_path}")
+
+    # Extract metadata
+    metadata = {
+        "table_name": table_name,
+        "row_count": row_count,
+        "column_count": column_count,
+        "column_info": column_info,
+        "data_sample": data_sample
+    }
+
+    # Save metadata; orjson encodes numpy and datetime values natively
+    metadata_path = f'data/metadata/{table_name}_metadata.json'
+    with open(metadata_path, 'wb') as f:
+        f.write(orjson.dumps(
+            metadata,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_INDENT_2,
+            default=str
+        ))
+    print(f"  ✓ Saved metadata to {metadata_path}")
+
+    logging.info(f"Successfully ingested {table_name}: {row_count} rows, {column_count} columns")
+
+    return table_name, row_count
+
 def ingest_data():
     """
     Ingest data from nectec_demo PostgreSQL database.
     Saves data to data/landing and metadata to data/metadata.
     """
     load_dotenv()
-    
-    db_host = os.getenv('DB_HOST')
-    db_port = os.getenv('DB_PORT')
     db_name = os.getenv('DB_NAME')
-    db_user = os.getenv('DB_USER')
-    db_password = os.getenv('DB_PASSWORD')
-    
-    connection_string = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
     
     try:
         logging.info(f"Connecting to database: {db_name}")
-        engine = create_engine(connection_string)
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
+        engine = create_db_engine(pool_size=POOL_SIZE)
+        
+        with engine.connect() as conn:
+            tables = inspect(conn).get_table_names()
+            cols_by_table = load_column_info(conn)
         
         logging.info(f"Connected to database. Found {len(tables)} tables: {tables}")
         print(f"✓ Connected to {db_name} database")
@@ -42,51 +177,13 @@ def ingest_data():
         os.makedirs('data/landing', exist_ok=True)
         os.makedirs('data/metadata', exist_ok=True)
         
-        for table_name in tables:
-            logging.info(f"Ingesting table: {table_name}")
-            print(f"\n📊 Processing table: {table_name}")
-            
-            # Save data to landing
-            df = pd.read_sql_table(table_name, engine)
-            csv_path = f'data/landing/{table_name}.csv'
-            df.to_csv(csv_path, index=False)
-            print(f"  ✓ Saved {len(df)} rows to {csv_path}")
-            
-            # Extract metadata
-            columns = inspector.get_columns(table_name)
-            metadata = {
-                "table_name": table_name,
-                "row_count": len(df),
-                "column_count": len(df.columns),
-                "column_info": [],
-                "data_sample": df.head(5).to_dict(orient='records')
-            }
-            
-            for col in columns:
-                col_info = {
-                    "column_name": col['name'],
-                    "data_type": str(col['type']),
-                    "nullable": col['nullable'],
-                    "default": str(col['default']) if col['default'] else None,
-                    "description": col.get('comment', '')
-                }
-                metadata["column_info"].append(col_info)
-            
-            # Save metadata
-            def json_serial(obj):
-                """JSON serializer for objects not serializable by default json code"""
-                if isinstance(obj, (pd.Timestamp, pd.Series, pd.Index)):
-                    return str(obj)
-                return str(obj)
-
-            metadata_path = f'data/metadata/{table_name}_metadata.json'
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=4, default=json_serial)
-            print(f"  ✓ Saved metadata to {metadata_path}")
-                
-            logging.info(f"Successfully ingested {table_name}: {len(df)} rows, {len(df.columns)} columns")
+        # Tables are extracted concurrently, one pooled connection per worker
+        max_workers = max(1, min(len(tables), POOL_SIZE))
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            results = list(ex.map(lambda t: ingest_one(t, engine, cols_by_table.get(t, [])), tables))
         
-        print(f"\n✅ Ingestion complete! Processed {len(tables)} tables.")
+        total_rows = sum(row_count for _, row_count in results)
+        print(f"\n✅ Ingestion complete! Processed {len(tables)} tables ({total_rows:,} rows).")
         logging.info("Data ingestion completed successfully")
             
     except Exception as e: